@@ -1,79 +1,134 @@
 #!/Users/jonasneves/Documents/GitHub/serverless-llm/venv/bin/python
 
-import json
+import functools
+import gzip
+import hashlib
+import http.client
+import mmap
 import os
+import re
+import select
 import signal
+import socket
 import struct
 import subprocess
 import sys
 import time
-import urllib.request
 from pathlib import Path
-from shutil import which
-from typing import Any, Dict, Optional, Tuple
+from shutil import copyfileobj, which
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
+try:
+    from orjson import dumps as _json_dumps, loads as _json_loads
+except ImportError:
+    try:
+        import ujson as json
+    except ImportError:
+        import json
 
-HOST_NAME = "io.neevs.serverless_llm"
+    def _json_loads(data: Any) -> Any:
+        return json.loads(bytes(data))
 
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
-def _read_env_config() -> Dict[str, str]:
-    config = {}
-    env_file = Path(__file__).resolve().parent / ".shipctl.env"
 
-    if not env_file.exists():
-        return config
+HOST_NAME = "io.neevs.serverless_llm"
+ENV_FILE = Path(__file__).resolve().parent / ".shipctl.env"
+ENV_LINE_RE = re.compile(r"^[ \t]*([^#=\s][^=\n]*?)[ \t]*=[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
+# Match: url = git@github.com:owner/repo.git or url = https://github.com/owner/repo.git
+GIT_REMOTE_RE = re.compile(r"url\s*=\s*(?:git@github\.com:|https://github\.com/)([^/]+)/([^/\s]+?)(?:\.git)?$", re.MULTILINE)
+TAIL_CHUNK_SIZE = 8192
+TAIL_MAX_BYTES = 1024 * 1024
+NVM_VERSIONS_DIR = Path(".nvm", "versions", "node")
+LOG_ROTATE_BYTES = 8 * 1024 * 1024
+LOG_OPEN_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+LOG_ARCHIVE_COUNT = 3
+LOG_SEED_LINES = 120
+START_GRACE_S = 0.8
+# Lines uvicorn (dev-chat) and vite (dev-interface-local) print only after the port is bound.
+READY_LINE_RE = re.compile(rb"^(?:INFO:\s+Uvicorn running on |\s+\S+\s+Local:\s+https?://)", re.MULTILINE)
+# Chrome native messaging frames: 32-bit length prefix in native (little-endian) order.
+MESSAGE_LENGTH = struct.Struct("<I")
+
+_env_cache: Dict[str, Any] = {"key": None, "data": {}}
+_repo_root_cache: Dict[Tuple[Optional[str], Optional[Tuple[int, int]]], Path] = {}
+# state path -> (stat key, digest of the bytes on disk, parsed state)
+_state_cache: Dict[Path, Tuple[Tuple[int, int, int], bytes, dict]] = {}
+_read_buffer = bytearray(65536)
+_health_conns: Dict[Tuple[str, str], http.client.HTTPConnection] = {}
+
 
+def _read_env_config() -> Dict[str, str]:
     try:
-        for line in env_file.read_text("utf-8").splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, value = line.split("=", 1)
-                config[key.strip()] = value.strip()
-    except Exception:
-        pass
+        st = ENV_FILE.stat()
+        key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    if key == _env_cache["key"]:
+        return _env_cache["data"]
+
+    config = {}
+    if key is not None:
+        try:
+            config = dict(ENV_LINE_RE.findall(ENV_FILE.read_text("utf-8")))
+        except Exception:
+            pass
 
+    _env_cache.update(key=key, data=config)
     return config
 
 
 def _read_message() -> Optional[Dict[str, Any]]:
-    raw_length = sys.stdin.buffer.read(4)
-    if not raw_length:
-        return None
-    message_length = struct.unpack("<I", raw_length)[0]
+    with memoryview(_read_buffer)[:MESSAGE_LENGTH.size] as prefix:
+        if sys.stdin.buffer.readinto(prefix) != MESSAGE_LENGTH.size:
+            return None
+    message_length = MESSAGE_LENGTH.unpack_from(_read_buffer)[0]
     if message_length <= 0:
         return None
-    data = sys.stdin.buffer.read(message_length)
-    if not data:
-        return None
-    return json.loads(data.decode("utf-8"))
+    if message_length > len(_read_buffer):
+        _read_buffer.extend(bytes(message_length - len(_read_buffer)))
+    with memoryview(_read_buffer)[:message_length] as view:
+        if sys.stdin.buffer.readinto(view) != message_length:
+            return None
+        return _json_loads(view)
 
 
 def _write_message(message: Dict[str, Any]) -> None:
-    encoded = json.dumps(message).encode("utf-8")
-    sys.stdout.buffer.write(struct.pack("<I", len(encoded)))
-    sys.stdout.buffer.write(encoded)
+    encoded = _json_dumps(message)
+    sys.stdout.buffer.write(MESSAGE_LENGTH.pack(len(encoded)) + encoded)
     sys.stdout.buffer.flush()
 
 
-def _find_repo_root(custom_path: Optional[str] = None) -> Path:
+def _is_repo_root(path: Path) -> bool:
+    return (path / "Makefile").exists() and (path / "app" / "chat" / "backend" / "chat_server.py").exists()
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_repo_root() -> Optional[Path]:
+    return next((parent for parent in Path(__file__).resolve().parents if _is_repo_root(parent)), None)
+
+
+def _find_repo_root(env_config: Dict[str, str], custom_path: Optional[str] = None) -> Path:
+    key = (custom_path, _env_cache["key"])
+    if key in _repo_root_cache:
+        return _repo_root_cache[key]
+
     if custom_path:
         candidate = Path(custom_path).expanduser().resolve()
-        if (candidate / "Makefile").exists() and (candidate / "app" / "chat" / "backend" / "chat_server.py").exists():
-            return candidate
+        if _is_repo_root(candidate):
+            return _repo_root_cache.setdefault(key, candidate)
         raise RuntimeError(f"Custom repo path invalid: {custom_path} (expected Makefile and app/chat/backend/chat_server.py)")
 
-    env_config = _read_env_config()
     if "REPO_PATH" in env_config and env_config["REPO_PATH"]:
         candidate = Path(env_config["REPO_PATH"]).expanduser().resolve()
-        if (candidate / "Makefile").exists() and (candidate / "app" / "chat" / "backend" / "chat_server.py").exists():
-            return candidate
+        if _is_repo_root(candidate):
+            return _repo_root_cache.setdefault(key, candidate)
 
-    here = Path(__file__).resolve()
-    for parent in [here.parent, *here.parents]:
-        if (parent / "Makefile").exists() and (parent / "app" / "chat" / "backend" / "chat_server.py").exists():
-            return parent
+    detected = _detect_repo_root()
+    if detected is not None:
+        return _repo_root_cache.setdefault(key, detected)
 
     raise RuntimeError("Could not locate repo root (expected Makefile and app/chat/backend/chat_server.py). Set REPO_PATH in .shipctl.env or extension settings.")
 
@@ -84,87 +139,217 @@ def _state_paths(repo_root: Path) -> Tuple[Path, Path]:
     return state_dir / "state.json", state_dir / "backend.log"
 
 
-def _is_pid_alive(pid: int) -> bool:
+def _proc_stat(pid: int) -> Optional[List[bytes]]:
     try:
-        os.kill(pid, 0)
-        return True
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
     except OSError:
+        return None
+    # Fields after the parenthesised comm: state is field 3, starttime field 22.
+    return data.rpartition(b")")[2].split()
+
+
+def _proc_start_ticks(pid: int) -> Optional[int]:
+    if not sys.platform.startswith("linux"):
+        return None
+    fields = _proc_stat(pid)
+    return int(fields[19]) if fields else None
+
+
+def _is_pid_alive(pid: int, start_ticks: Optional[int] = None) -> bool:
+    if not sys.platform.startswith("linux"):
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    fields = _proc_stat(pid)
+    if not fields or fields[0] in (b"Z", b"X"):
         return False
+    # A different start time (clock ticks since boot) means the PID was reused.
+    return not isinstance(start_ticks, int) or int(fields[19]) == start_ticks
+
+
+def _state_digest(data: Any) -> bytes:
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_ino, st.st_size, st.st_mtime_ns
 
 
 def _read_state(state_path: Path) -> dict:
-    if not state_path.exists():
+    try:
+        st = os.stat(state_path)
+    except OSError:
+        _state_cache.pop(state_path, None)
+        return {}
+    cached = _state_cache.get(state_path)
+    if cached and cached[0] == _stat_key(st):
+        return cached[2]
+    _state_cache.pop(state_path, None)
+
+    try:
+        fd = os.open(state_path, os.O_RDONLY)
+    except OSError:
         return {}
     try:
-        return json.loads(state_path.read_text("utf-8"))
+        with mmap.mmap(fd, 0, prot=mmap.PROT_READ) as mm, memoryview(mm) as view:
+            digest = _state_digest(view)
+            state = _json_loads(view)
     except Exception:
         return {}
+    finally:
+        os.close(fd)
+    _state_cache[state_path] = (_stat_key(st), digest, state)
+    return state
 
 
 def _write_state(state_path: Path, state: Dict[str, Any]) -> None:
-    state_path.write_text(json.dumps(state, indent=2), "utf-8")
-
+    data = _json_dumps(state)
+    digest = _state_digest(data)
+    cached = _state_cache.get(state_path)
+    if cached and cached[1] == digest:
+        return
 
-def _health_check(url: str, timeout_s: float = 1.5) -> bool:
+    # Per-process temp name: a polling host and a one-shot host may write concurrently.
+    tmp_path = state_path.with_name(f"{state_path.name}.{os.getpid()}.tmp")
     try:
-        with urllib.request.urlopen(url, timeout=timeout_s) as resp:
-            return 200 <= resp.status < 300
-    except Exception:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    _state_cache[state_path] = (_stat_key(os.stat(state_path)), digest, state)
+
+
+def _health_check(url: str, timeout_s: float = 0.5) -> bool:
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    if parts.scheme not in ("http", "https") or not parts.netloc:
         return False
+    key = (parts.scheme, parts.netloc)
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+
+    # Reuse a keep-alive connection per origin; retry once on a fresh
+    # connection if the server dropped the idle one.
+    for _ in range(2):
+        conn = _health_conns.get(key)
+        fresh = conn is None
+        try:
+            if fresh:
+                conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                conn = _health_conns[key] = conn_cls(parts.netloc, timeout=timeout_s)
+            conn.request("GET", target)
+            with conn.getresponse() as resp:
+                resp.read()
+                # Redirects are not followed; a 3xx still means the server is up.
+                return 200 <= resp.status < 400
+        except Exception as e:
+            if conn is not None:
+                conn.close()
+            _health_conns.pop(key, None)
+            # A timeout means the server is slow, not that the idle connection went stale.
+            if fresh or isinstance(e, socket.timeout):
+                return False
+    return False
 
 
 def _tail_file(path: Path, max_lines: int = 50) -> str:
-    if not path.exists():
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
         return ""
     try:
-        lines = path.read_text("utf-8", errors="replace").splitlines()
-        return "\n".join(lines[-max_lines:])
+        # Read backwards until max_lines complete lines are buffered, never
+        # more than TAIL_MAX_BYTES in total.
+        pos = os.lseek(fd, 0, os.SEEK_END)
+        floor = max(0, pos - TAIL_MAX_BYTES)
+        chunks = []
+        newlines = 0
+        while pos > floor and newlines <= max_lines:
+            size = min(TAIL_CHUNK_SIZE, pos - floor)
+            pos -= size
+            chunk = os.pread(fd, size, pos)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+        lines = b"".join(reversed(chunks)).decode("utf-8", errors="replace").splitlines()[-max_lines:]
     except Exception:
         return ""
+    finally:
+        os.close(fd)
+    return "\n".join(lines)
 
 
-def _augment_path_for_node(env: Dict[str, str]) -> Dict[str, str]:
-    path_entries = []
-    home = Path.home()
+def _rotate_log(log_path: Path) -> None:
+    try:
+        if log_path.stat().st_size <= LOG_ROTATE_BYTES:
+            return
+        # Shift backend.log.N.gz up by one, dropping the oldest, then gzip into .1.gz.
+        for n in range(LOG_ARCHIVE_COUNT - 1, 0, -1):
+            older = log_path.with_name(f"{log_path.name}.{n}.gz")
+            if older.exists():
+                os.replace(older, log_path.with_name(f"{log_path.name}.{n + 1}.gz"))
+        with open(log_path, "rb") as src, gzip.open(log_path.with_name(f"{log_path.name}.1.gz"), "wb", compresslevel=1) as dst:
+            copyfileobj(src, dst)
+        # Seed the new segment with the last lines so tails never need the archive.
+        tail = _tail_file(log_path, LOG_SEED_LINES)
+        log_path.write_bytes(f"{tail}\n".encode("utf-8") if tail else b"")
+    except OSError:
+        pass
+
+
+@functools.lru_cache(maxsize=1)
+def _node_toolchain(existing_path: str, home: str, nvm_mtime: Optional[int]) -> Tuple[Dict[str, str], Optional[str]]:
+    home_dir = Path(home)
 
     candidates = [
         Path("/opt/homebrew/bin"),
         Path("/usr/local/bin"),
         Path("/usr/bin"),
         Path("/bin"),
-        home / ".local" / "bin",
-        home / ".bun" / "bin",
-        home / ".volta" / "bin",
-        home / ".asdf" / "shims",
-        home / ".local" / "share" / "mise" / "shims",
-        home / ".fnm",
-        home / ".fnm" / "current" / "bin",
+        home_dir / ".local" / "bin",
+        home_dir / ".bun" / "bin",
+        home_dir / ".volta" / "bin",
+        home_dir / ".asdf" / "shims",
+        home_dir / ".local" / "share" / "mise" / "shims",
+        home_dir / ".fnm",
+        home_dir / ".fnm" / "current" / "bin",
     ]
 
-    nvm_root = home / ".nvm" / "versions" / "node"
-    try:
-        if nvm_root.is_dir():
-            candidates.extend(v / "bin" for v in sorted(nvm_root.iterdir(), reverse=True))
-    except Exception:
-        pass
-
-    for entry in candidates:
+    if nvm_mtime is not None:
         try:
-            if entry.is_dir():
-                path_entries.append(str(entry))
-        except Exception:
+            with os.scandir(home_dir / NVM_VERSIONS_DIR) as it:
+                versions = sorted((entry.path for entry in it if entry.is_dir()), reverse=True)
+            candidates.extend(Path(v) / "bin" for v in versions)
+        except OSError:
             pass
 
-    existing = env.get("PATH", "")
-    combined = ":".join([*path_entries, existing]) if existing else ":".join(path_entries)
-    env = dict(env)
-    if combined:
-        env["PATH"] = combined
-    return env
+    path_entries = [str(entry) for entry in candidates if os.path.isdir(entry)]
+    combined = ":".join([*path_entries, existing_path]) if existing_path else ":".join(path_entries)
+    return {**os.environ, "PATH": combined}, which("npm", path=combined)
 
 
-def _find_extension_dir() -> Path:
-    env_config = _read_env_config()
+def _build_child_env() -> Tuple[Dict[str, str], Optional[str]]:
+    # Installing or removing an nvm version changes the directory mtime,
+    # which invalidates the memoized toolchain.
+    home = Path.home()
+    try:
+        nvm_mtime = (home / NVM_VERSIONS_DIR).stat().st_mtime_ns
+    except OSError:
+        nvm_mtime = None
+    return _node_toolchain(os.environ.get("PATH", ""), str(home), nvm_mtime)
+
+
+def _find_extension_dir(env_config: Dict[str, str]) -> Path:
     if "EXTENSION_DIR" in env_config and env_config["EXTENSION_DIR"]:
         candidate = Path(env_config["EXTENSION_DIR"]).expanduser().resolve()
         if (candidate / "Makefile").exists() and (candidate / "package.json").exists():
@@ -173,52 +358,41 @@ def _find_extension_dir() -> Path:
     raise RuntimeError("Extension directory not configured. Re-run the native host install script.")
 
 
-def _run_make_target(repo_root: Path, target: str, log_path: Path) -> dict:
+def _run_make_target(working_dir: Path, target: str, log_path: Path) -> dict:
     allowed_targets = {"build-playground", "build-extension"}
     if target not in allowed_targets:
         return {"ok": False, "error": f"Unsupported make target: {target}"}
 
-    if target == "build-extension":
-        try:
-            working_dir = _find_extension_dir()
-        except Exception as e:
-            return {"ok": False, "error": str(e)}
-    else:
-        working_dir = repo_root
-
     command = ["make", target]
 
     log_path.parent.mkdir(exist_ok=True)
-    with open(log_path, "a", buffering=1) as log_f:
-        log_f.write(f"\n--- make {target} {time.strftime('%Y-%m-%d %H:%M:%S')} ---\n")
-        log_f.write(f"Working directory: {working_dir}\n")
-        log_f.flush()
+    _rotate_log(log_path)
+    log_fd = os.open(log_path, LOG_OPEN_FLAGS, 0o644)
+    try:
+        header = f"\n--- make {target} {time.strftime('%Y-%m-%d %H:%M:%S')} ---\nWorking directory: {working_dir}\n"
 
-        env = _augment_path_for_node(os.environ.copy())
-        npm_path = which("npm", path=env.get("PATH", ""))
+        env, npm_path = _build_child_env()
         if npm_path is None:
             msg = (
                 "npm not found in PATH for the native host. "
                 "Install Node.js (npm) and re-run the native-host install script so the browser picks it up."
             )
-            log_f.write(f"{msg}\n")
-            log_f.write(f"PATH={env.get('PATH','')}\n")
-            log_f.flush()
+            os.write(log_fd, f"{header}{msg}\nPATH={env.get('PATH','')}\n".encode("utf-8"))
             return {"ok": False, "error": msg, "logTail": _tail_file(log_path, 120)}
-        log_f.write(f"Using npm at: {npm_path}\n")
-        log_f.flush()
+        os.write(log_fd, f"{header}Using npm at: {npm_path}\n".encode("utf-8"))
 
         try:
             proc = subprocess.run(
                 command,
                 cwd=str(working_dir),
-                stdout=log_f,
-                stderr=log_f,
+                stdout=log_fd,
+                stderr=log_fd,
                 env=env,
-                text=True,
             )
         except Exception as e:
             return {"ok": False, "error": f"Failed to run make {target}: {e}", "logTail": _tail_file(log_path, 120)}
+    finally:
+        os.close(log_fd)
 
     ok = proc.returncode == 0
     return {
@@ -229,6 +403,44 @@ def _run_make_target(repo_root: Path, target: str, log_path: Path) -> dict:
     }
 
 
+def _wait_pid_exit(pid: int, timeout_s: float) -> bool:
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass  # Kernel < 5.3: fall through to polling.
+        else:
+            try:
+                poller = select.poll()
+                poller.register(fd, select.POLLIN)
+                return bool(poller.poll(timeout_s * 1000))
+            finally:
+                os.close(fd)
+    elif hasattr(select, "kqueue"):
+        kq = select.kqueue()
+        try:
+            event = select.kevent(
+                pid,
+                filter=select.KQ_FILTER_PROC,
+                flags=select.KQ_EV_ADD | select.KQ_EV_ONESHOT,
+                fflags=select.KQ_NOTE_EXIT,
+            )
+            return bool(kq.control([event], 1, timeout_s))
+        except ProcessLookupError:
+            return True
+        finally:
+            kq.close()
+
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if not _is_pid_alive(pid):
+            return True
+        time.sleep(0.1)
+    return False
+
+
 def _stop_process_tree(pid: int) -> bool:
     try:
         os.killpg(pid, signal.SIGTERM)
@@ -238,11 +450,8 @@ def _stop_process_tree(pid: int) -> bool:
         except Exception:
             return False
 
-    deadline = time.time() + 3.0
-    while time.time() < deadline:
-        if not _is_pid_alive(pid):
-            return True
-        time.sleep(0.1)
+    if _wait_pid_exit(pid, 3.0):
+        return True
 
     try:
         os.killpg(pid, signal.SIGKILL)
@@ -257,34 +466,50 @@ def _stop_process_tree(pid: int) -> bool:
 def _start_backend(repo_root: Path, state_path: Path, log_path: Path, mode: str) -> dict:
     state = _read_state(state_path)
     pid = state.get("pid")
-    if isinstance(pid, int) and _is_pid_alive(pid):
+    if isinstance(pid, int) and _is_pid_alive(pid, state.get("startTicks")):
         return {"ok": True, "status": "running", "pid": pid}
 
-    command = ["make", "dev-chat"] if mode == "dev-chat" else ["make", "dev-interface-local"]
-
     log_path.parent.mkdir(exist_ok=True)
-    log_f = open(log_path, "a", buffering=1)
-    log_f.write(f"\n--- start {time.strftime('%Y-%m-%d %H:%M:%S')} mode={mode} ---\n")
-    log_f.flush()
-
+    _rotate_log(log_path)
+    log_fd = os.open(log_path, LOG_OPEN_FLAGS, 0o644)
     try:
+        os.write(log_fd, f"\n--- start {time.strftime('%Y-%m-%d %H:%M:%S')} mode={mode} ---\n".encode("utf-8"))
+        start_offset = os.fstat(log_fd).st_size
+        # The target repo's Makefile owns venv/.env setup for these modes, so keep going through make.
         proc = subprocess.Popen(
-            command,
+            ["make", mode],
             cwd=str(repo_root),
-            stdout=log_f,
-            stderr=log_f,
+            stdout=log_fd,
+            stderr=log_fd,
             start_new_session=True,
-            env=os.environ.copy(),
         )
     except Exception as e:
         return {"ok": False, "error": f"Failed to start backend: {e}"}
+    finally:
+        # The child holds its own copy; the host doesn't keep the log open.
+        os.close(log_fd)
+
+    # Block on process exit for up to the grace period, checking the log for
+    # a readiness line at backoff intervals (10 ms, 20 ms, ...).
+    with open(log_path, "rb") as log_r:
+        log_r.seek(start_offset)
+        output = b""
+        delay = 0.01
+        waited = 0.0
+        while waited < START_GRACE_S:
+            if _wait_pid_exit(proc.pid, delay):
+                break
+            waited += delay
+            output += log_r.read()
+            if READY_LINE_RE.search(output):
+                break
+            delay = min(delay * 2, START_GRACE_S - waited)
 
-    time.sleep(0.8)
     if proc.poll() is not None:
         tail = _tail_file(log_path, max_lines=60)
         return {"ok": False, "error": "Backend failed to start", "logTail": tail}
 
-    state = {"pid": proc.pid, "mode": mode, "startedAt": int(time.time())}
+    state = {"pid": proc.pid, "mode": mode, "startedAt": int(time.time()), "startTicks": _proc_start_ticks(proc.pid)}
     _write_state(state_path, state)
     return {"ok": True, "status": "running", "pid": proc.pid}
 
@@ -292,7 +517,7 @@ def _start_backend(repo_root: Path, state_path: Path, log_path: Path, mode: str)
 def _status(repo_root: Path, state_path: Path, chat_base_url: Optional[str]) -> dict:
     state = _read_state(state_path)
     pid = state.get("pid")
-    alive = isinstance(pid, int) and _is_pid_alive(pid)
+    alive = isinstance(pid, int) and _is_pid_alive(pid, state.get("startTicks"))
     health_url = None
     healthy = None
 
@@ -300,7 +525,8 @@ def _status(repo_root: Path, state_path: Path, chat_base_url: Optional[str]) ->
         base = chat_base_url.strip().rstrip("/")
         if base:
             health_url = f"{base}/health"
-            healthy = _health_check(health_url)
+            if alive:
+                healthy = _health_check(health_url)
 
     return {
         "ok": True,
@@ -318,7 +544,7 @@ def _stop(state_path: Path) -> dict:
     pid = state.get("pid")
     if not isinstance(pid, int):
         return {"ok": True, "status": "stopped"}
-    if not _is_pid_alive(pid):
+    if not _is_pid_alive(pid, state.get("startTicks")):
         _write_state(state_path, {})
         return {"ok": True, "status": "stopped"}
 
@@ -327,62 +553,51 @@ def _stop(state_path: Path) -> dict:
     return {"ok": ok, "status": "stopped" if ok else "error", "pid": pid}
 
 
-def main() -> None:
-    message = _read_message()
-    if message is None:
-        return
-
+def _handle_message(message: Dict[str, Any]) -> Dict[str, Any]:
     custom_repo_path = message.get("repoPath")
+    env_config = _read_env_config()
 
     try:
-        repo_root = _find_repo_root(custom_repo_path)
+        repo_root = _find_repo_root(env_config, custom_repo_path)
         state_path, log_path = _state_paths(repo_root)
     except Exception as e:
-        _write_message({"ok": False, "error": str(e)})
-        return
+        return {"ok": False, "error": str(e)}
 
     action = message.get("action")
     if action == "make":
         target = message.get("target")
         if not isinstance(target, str) or not target.strip():
-            _write_message({"ok": False, "error": "Missing make target"})
-            return
+            return {"ok": False, "error": "Missing make target"}
         target = target.strip()
 
         if target == "build-extension":
             try:
-                extension_dir = _find_extension_dir()
-                log_dir = extension_dir / ".native-host"
+                working_dir = _find_extension_dir(env_config)
+                log_dir = working_dir / ".native-host"
                 log_dir.mkdir(exist_ok=True)
                 make_log_path = log_dir / f"make-{target}.log"
             except Exception as e:
-                _write_message({"ok": False, "error": str(e)})
-                return
+                return {"ok": False, "error": str(e)}
         else:
+            working_dir = repo_root
             make_log_path = repo_root / ".native-host" / f"make-{target}.log"
 
-        _write_message(_run_make_target(repo_root, target, make_log_path))
-        return
+        return _run_make_target(working_dir, target, make_log_path)
 
     if action == "start":
         mode = message.get("mode") or "dev-chat"
         if mode not in ("dev-chat", "dev-interface-local"):
-            _write_message({"ok": False, "error": f"Unknown mode: {mode}"})
-            return
-        _write_message(_start_backend(repo_root, state_path, log_path, mode))
-        return
+            return {"ok": False, "error": f"Unknown mode: {mode}"}
+        return _start_backend(repo_root, state_path, log_path, mode)
 
     if action == "stop":
-        _write_message(_stop(state_path))
-        return
+        return _stop(state_path)
 
     if action == "status":
-        _write_message(_status(repo_root, state_path, message.get("chatApiBaseUrl")))
-        return
+        return _status(repo_root, state_path, message.get("chatApiBaseUrl"))
 
     if action == "logs":
-        _write_message({"ok": True, "logTail": _tail_file(log_path, max_lines=120)})
-        return
+        return {"ok": True, "logTail": _tail_file(log_path, max_lines=120)}
 
     if action == "get_config":
         # Auto-detect configuration values
@@ -400,47 +615,49 @@ def main() -> None:
         git_config = repo_root / ".git" / "config"
         if git_config.exists():
             try:
-                content = git_config.read_text("utf-8")
-                import re
-                # Match: url = git@github.com:owner/repo.git or url = https://github.com/owner/repo.git
-                match = re.search(r'url\s*=\s*(?:git@github\.com:|https://github\.com/)([^/]+)/([^/\s]+?)(?:\.git)?$', content, re.MULTILINE)
+                match = GIT_REMOTE_RE.search(git_config.read_text("utf-8"))
                 if match:
                     detected["githubRepoOwner"] = match.group(1)
                     detected["githubRepoName"] = match.group(2)
             except Exception:
                 pass
 
-        _write_message({"ok": True, **detected})
-        return
+        return {"ok": True, **detected}
 
     if action == "save_config":
         try:
-            env_file = Path(__file__).resolve().parent / ".shipctl.env"
-            existing_config = _read_env_config()
-            extension_dir = existing_config.get("EXTENSION_DIR", "")
-            python_path = message.get("pythonPath", "").strip()
-            repo_path = message.get("repoPath", "").strip()
-
-            content = f"""# shipctl configuration
-# Auto-generated by extension settings / install script
-
-# Path to Python interpreter (for native host)
-PYTHON_PATH={python_path}
-
-# Path to serverless-llm repository (for backend operations)
-REPO_PATH={repo_path}
-
-# Path to extension source directory (set by install script)
-EXTENSION_DIR={extension_dir}
-"""
-            env_file.write_text(content, "utf-8")
-            _write_message({"ok": True, "status": "saved", "path": str(env_file)})
-            return
+            try:
+                content = ENV_FILE.read_text("utf-8")
+            except FileNotFoundError:
+                content = "# shipctl configuration\n"
+            # Rewrite only the managed keys in place; comments and other keys are kept.
+            for key, field in (("PYTHON_PATH", "pythonPath"), ("REPO_PATH", "repoPath")):
+                line = f"{key}={message.get(field, '').strip()}"
+                content, count = re.subn(rf"^[ \t]*{key}[ \t]*=.*$", lambda _: line, content, flags=re.MULTILINE)
+                if not count:
+                    if not content.endswith("\n"):
+                        content += "\n"
+                    content += f"{line}\n"
+            ENV_FILE.write_text(content, "utf-8")
+            return {"ok": True, "status": "saved", "path": str(ENV_FILE)}
         except Exception as e:
-            _write_message({"ok": False, "error": f"Failed to save config: {e}"})
-            return
+            return {"ok": False, "error": f"Failed to save config: {e}"}
+
+    return {"ok": False, "error": f"Unknown action: {action}"}
 
-    _write_message({"ok": False, "error": f"Unknown action: {action}"})
+
+def main() -> None:
+    # Serve until Chrome closes stdin: one message for sendNativeMessage,
+    # many for a port opened with connectNative.
+    while True:
+        message = _read_message()
+        if message is None:
+            return
+        try:
+            response = _handle_message(message)
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        _write_message(response)
 
 
 if __name__ == "__main__":
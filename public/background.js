@@ -14,7 +14,39 @@ chrome.sidePanel
 // Native messaging host for local backend control
 const NATIVE_HOST_NAME = 'io.neevs.serverless_llm';
 
+// Polled actions go over one long-lived port so the host process (and its caches) stay warm.
+// Everything else uses a one-shot host so a long `make` never queues behind status polls.
+const PORT_ACTIONS = new Set(['status', 'logs']);
+let nativePort = null;
+
+function connectNativePort() {
+  const port = chrome.runtime.connectNative(NATIVE_HOST_NAME);
+  const pending = [];
+  port.onMessage.addListener((message) => pending.shift()?.(message));
+  port.onDisconnect.addListener(() => {
+    const error = chrome.runtime.lastError?.message || 'Native host disconnected';
+    if (nativePort?.port === port) nativePort = null;
+    for (const resolve of pending.splice(0)) resolve({ ok: false, error });
+  });
+  return { port, pending };
+}
+
+function sendPortMessage(payload) {
+  return new Promise((resolve) => {
+    try {
+      nativePort ??= connectNativePort();
+      nativePort.port.postMessage(payload);
+      nativePort.pending.push(resolve);
+    } catch (e) {
+      nativePort = null;
+      resolve({ ok: false, error: e?.message || String(e) });
+    }
+  });
+}
+
 function sendNativeMessage(payload) {
+  if (PORT_ACTIONS.has(payload.action)) return sendPortMessage(payload);
+
   return new Promise((resolve) => {
     if (chrome.runtime.sendNativeMessage) {
       chrome.runtime.sendNativeMessage(NATIVE_HOST_NAME, payload, (response) => {
@@ -28,9 +28,15 @@ BACKGROUND_JS_PATH = EXT_ROOT / "public/background.js"
 OAUTH_PROXY_DIR = Path.home() / "Documents/GitHub/agentivo/oauth-proxy"
 DEPLOY_YML_PATH = OAUTH_PROXY_DIR / ".github/workflows/deploy.yml"
 
+# Last OAUTH_SECRET_* env entry in a block (the next line is not another secret)
+SECRET_BLOCK_END_RE = re.compile(r"^([ \t]*).*: \$\{\{ secrets\.OAUTH_SECRET_.*\n(?!.*OAUTH_SECRET_)", re.MULTILINE)
+
 
 def run_cmd(cmd, cwd=None):
-    result = subprocess.run(cmd, shell=True, cwd=cwd, capture_output=True, text=True)
+    try:
+        result = subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
     return result.returncode == 0
 
 
@@ -51,34 +57,29 @@ def update_background_js(client_id):
 def add_github_secret(client_id, client_secret):
     """Add the secret to oauth-proxy repo."""
     secret_name = f"OAUTH_SECRET_{client_id}"
-    return run_cmd(f"gh secret set {secret_name} --body '{client_secret}'", cwd=OAUTH_PROXY_DIR)
+    return run_cmd(["gh", "secret", "set", secret_name, "--body", client_secret], cwd=OAUTH_PROXY_DIR)
 
 
 def update_deploy_yml(client_id):
     """Add the secret to deploy.yml env sections."""
     content = DEPLOY_YML_PATH.read_text()
-    secret_line = f"          OAUTH_SECRET_{client_id}: ${{{{ secrets.OAUTH_SECRET_{client_id} }}}}"
 
     if f"OAUTH_SECRET_{client_id}" in content:
         return False  # Already exists
 
-    lines = content.split('\n')
-    new_lines = []
-    i = 0
-    while i < len(lines):
-        new_lines.append(lines[i])
-        if 'OAUTH_SECRET_' in lines[i] and ': ${{ secrets.OAUTH_SECRET_' in lines[i]:
-            if i + 1 < len(lines) and 'OAUTH_SECRET_' not in lines[i + 1]:
-                new_lines.append(secret_line)
-        i += 1
-
-    DEPLOY_YML_PATH.write_text('\n'.join(new_lines))
+    secret_entry = f"OAUTH_SECRET_{client_id}: ${{{{ secrets.OAUTH_SECRET_{client_id} }}}}\n"
+    updated = SECRET_BLOCK_END_RE.sub(lambda m: m.group(0) + m.group(1) + secret_entry, content)
+
+    DEPLOY_YML_PATH.write_text(updated)
     return True
 
 
 def build_extension():
-    """Run npm build:extension."""
-    result = subprocess.run("npm run build:extension", shell=True, cwd=EXT_ROOT, capture_output=True, text=True)
+    """Run npm build:extension, streaming its output."""
+    try:
+        result = subprocess.run(["npm", "run", "build:extension"], cwd=EXT_ROOT)
+    except OSError:
+        return False
     return result.returncode == 0
 
 